@@ -1,18 +1,32 @@
 from __future__ import annotations
 
 import hashlib
-import json
 import logging
 import re
+import threading
 import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
-from typing import Dict, Iterable, List, Optional, Tuple
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 from urllib.parse import urljoin, urlparse
 
 import requests
-from bs4 import BeautifulSoup
-
-from .db import MEETING_FIELDS, upsert_meeting, update_page_checked, utc_now_iso
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from bs4 import BeautifulSoup, SoupStrainer, Tag
+
+from .db import (
+    compute_data_hash,
+    get_http_cache_entries,
+    list_pending_speakers,
+    save_http_cache_entries,
+    save_speaker_intro,
+    touch_meetings,
+    update_page_checked,
+    upsert_meetings,
+    utc_now_iso,
+)
 
 LOGGER = logging.getLogger(__name__)
 
@@ -21,6 +35,13 @@ USER_AGENT = (
     "(KHTML, like Gecko) Chrome/120.0 Safari/537.36"
 )
 REQUEST_TIMEOUT = 12
+# Bump whenever extraction output changes so cached detail pages are re-parsed.
+PARSER_VERSION = 2
+MAX_DETAIL_PAGES = 20
+MAX_DETAIL_WORKERS = 8
+PER_HOST_CONCURRENCY = 2
+SPEAKER_BATCH_SIZE = 20
+SPEAKER_SEARCH_DELAY = 1.0
 CRAWL_KEYWORDS = [
     "讲座",
     "报告",
@@ -32,6 +53,9 @@ CRAWL_KEYWORDS = [
     "Workshop",
     "Conference",
 ]
+CRAWL_KEYWORD_PATTERN = re.compile(
+    "|".join(re.escape(keyword) for keyword in CRAWL_KEYWORDS), re.IGNORECASE
+)
 
 LABELS = {
     "start_time": ["时间", "Date", "Time"],
@@ -41,13 +65,57 @@ LABELS = {
     "abstract": ["摘要", "Abstract"],
 }
 
+LABEL_ALTERNATION = "|".join(
+    re.escape(label.lower()) for labels in LABELS.values() for label in labels
+)
+LABEL_SCAN_PATTERN = re.compile(
+    "(?=({}))".format(
+        "|".join(re.escape(label) for labels in LABELS.values() for label in labels)
+    )
+)
+LABEL_LINE_PATTERN = re.compile(rf"^(?:{LABEL_ALTERNATION})|(?:{LABEL_ALTERNATION})[:：]")
+
 ONLINE_KEYWORDS = ["线上", "online", "zoom", "腾讯会议", "meeting link", "teams"]
 OFFLINE_KEYWORDS = ["线下", "offline", "现场"]
+ONLINE_KEYWORDS_LOWER = tuple(keyword.lower() for keyword in ONLINE_KEYWORDS)
+OFFLINE_KEYWORDS_LOWER = tuple(keyword.lower() for keyword in OFFLINE_KEYWORDS)
 
+LABEL_SEPARATOR_PATTERN = re.compile(r"[:：]")
 URL_PATTERN = re.compile(r"https?://[^\s)]+")
 DATE_PATTERN = re.compile(r"\d{4}[年/-]\d{1,2}[月/-]\d{1,2}[日]?")
 TIME_PATTERN = re.compile(r"\d{1,2}:\d{2}")
 
+TITLE_TAGS = ["h1", "h2", "h3", "title"]
+TITLE_TAG_NAMES = frozenset(TITLE_TAGS)
+LINE_TAGS = ["p", "li", "td", "tr", "div"]
+LINE_TAG_NAMES = frozenset(LINE_TAGS)
+STRING_TYPES = frozenset(Tag.MAIN_CONTENT_STRING_TYPES)
+LINK_STRAINER = SoupStrainer("a", href=True)
+DETAIL_STRAINER = SoupStrainer(TITLE_TAGS + LINE_TAGS)
+
+
+def build_session() -> requests.Session:
+    session = requests.Session()
+    session.headers["User-Agent"] = USER_AGENT
+    session.headers["Accept"] = "text/html,application/xhtml+xml;q=0.9,*/*;q=0.8"
+    session.headers["Accept-Encoding"] = "br, gzip, deflate"
+    adapter = HTTPAdapter(
+        pool_connections=16,
+        pool_maxsize=32,
+        max_retries=Retry(total=2, backoff_factor=0.3),
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+SESSION = build_session()
+HOST_SLOTS: Dict[str, threading.Semaphore] = defaultdict(
+    lambda: threading.Semaphore(PER_HOST_CONCURRENCY)
+)
+HOST_SLOTS_LOCK = threading.Lock()
+ENRICHMENT_LOCK = threading.Lock()
+
 
 @dataclass
 class CrawlResult:
@@ -57,27 +125,72 @@ class CrawlResult:
     source_url: str
 
 
-def fetch_html(url: str) -> Tuple[str, str]:
-    headers = {"User-Agent": USER_AGENT}
-    response = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+@dataclass
+class FetchedPage:
+    url: str
+    html: Optional[str]
+    etag: Optional[str]
+    last_modified: Optional[str]
+    content_hash: Optional[str]
+
+
+def host_slot(url: str) -> threading.Semaphore:
+    with HOST_SLOTS_LOCK:
+        return HOST_SLOTS[urlparse(url).netloc]
+
+
+def fetch_html(url: str, cached: Optional[Dict[str, Any]] = None) -> FetchedPage:
+    headers: Dict[str, str] = {}
+    if cached and cached.get("etag"):
+        headers["If-None-Match"] = cached["etag"]
+    if cached and cached.get("last_modified"):
+        headers["If-Modified-Since"] = cached["last_modified"]
+    with host_slot(url):
+        response = SESSION.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+
+    etag = response.headers.get("ETag")
+    last_modified = response.headers.get("Last-Modified")
+    if cached and response.status_code == 304:
+        return FetchedPage(
+            url=response.url,
+            html=None,
+            etag=etag or cached.get("etag"),
+            last_modified=last_modified or cached.get("last_modified"),
+            content_hash=cached.get("content_hash"),
+        )
     response.raise_for_status()
-    response.encoding = response.apparent_encoding or response.encoding
-    return response.text, response.url
+
+    content_hash = hashlib.blake2b(response.content, digest_size=32).hexdigest()
+    if cached and cached.get("content_hash") == content_hash:
+        html = None
+    else:
+        if "charset=" not in response.headers.get("Content-Type", "").lower():
+            response.encoding = response.apparent_encoding or response.encoding
+        html = response.text
+    return FetchedPage(
+        url=response.url,
+        html=html,
+        etag=etag,
+        last_modified=last_modified,
+        content_hash=content_hash,
+    )
 
 
 def normalize_text(text: str) -> str:
-    return re.sub(r"\s+", " ", text).strip()
+    return " ".join(text.split())
 
 
-def extract_candidate_links(html: str, base_url: str) -> List[str]:
-    soup = BeautifulSoup(html, "html.parser")
+def extract_candidate_links(
+    html: str, base_url: str, limit: Optional[int] = None
+) -> List[str]:
+    soup = BeautifulSoup(html, "lxml", parse_only=LINK_STRAINER)
     links: List[str] = []
     seen = set()
     for anchor in soup.find_all("a", href=True):
         text = normalize_text(anchor.get_text(" ", strip=True))
         if not text:
             continue
-        if not any(keyword.lower() in text.lower() for keyword in CRAWL_KEYWORDS):
+        if not CRAWL_KEYWORD_PATTERN.search(text):
             continue
         href = anchor["href"].strip()
         if href.startswith("#") or href.startswith("mailto:"):
@@ -90,36 +203,55 @@ def extract_candidate_links(html: str, base_url: str) -> List[str]:
             continue
         seen.add(absolute)
         links.append(absolute)
+        if limit is not None and len(links) >= limit:
+            break
     return links
 
 
 def build_lines(soup: BeautifulSoup) -> List[str]:
-    lines: List[str] = []
-    for element in soup.find_all(["p", "li", "td", "tr", "div"]):
-        text = normalize_text(element.get_text(" ", strip=True))
-        if len(text) < 2:
+    # One walk collects every string once; each block's line is then the
+    # slice of strings inside it, matching get_text on every block.
+    strings: List[str] = []
+    spans: List[List[int]] = []
+    stack = [iter(soup.contents)]
+    open_spans: List[Optional[List[int]]] = [None]
+    while stack:
+        node = next(stack[-1], None)
+        if node is None:
+            stack.pop()
+            span = open_spans.pop()
+            if span is not None:
+                span[1] = len(strings)
             continue
-        lines.append(text)
+        if isinstance(node, Tag):
+            span = None
+            if node.name in LINE_TAG_NAMES:
+                span = [len(strings), 0]
+                spans.append(span)
+            stack.append(iter(node.contents))
+            open_spans.append(span)
+        elif type(node) in STRING_TYPES:
+            text = normalize_text(node)
+            if text:
+                strings.append(text)
+
+    lines: List[str] = []
+    for first, last in spans:
+        text = " ".join(strings[first:last])
+        if len(text) >= 2:
+            lines.append(text)
     return lines
 
 
 def is_label_line(line: str) -> bool:
-    lowered = line.lower()
-    for labels in LABELS.values():
-        for label in labels:
-            label_lower = label.lower()
-            if lowered.startswith(label_lower) or f"{label_lower}:" in lowered:
-                return True
-            if f"{label_lower}：" in lowered:
-                return True
-    return False
+    return LABEL_LINE_PATTERN.search(line.lower()) is not None
 
 
 def split_label_value(line: str, labels: Iterable[str]) -> Optional[str]:
     for label in labels:
         if label in line:
             if ":" in line or "：" in line:
-                parts = re.split(r"[:：]", line, maxsplit=1)
+                parts = LABEL_SEPARATOR_PATTERN.split(line, maxsplit=1)
                 if len(parts) == 2 and label in parts[0]:
                     value = parts[1].strip()
                     if value:
@@ -140,12 +272,17 @@ def collect_block(lines: List[str], start_index: int, label: str) -> str:
         remainder = remainder.lstrip(" ：:")
         if remainder:
             collected.append(remainder)
-    for line in lines[start_index + 1 :]:
+    index = start_index + 1
+    count = len(lines)
+    while index < count:
+        line = lines[index]
         if is_label_line(line):
             break
         if line:
             collected.append(line)
-    return normalize_text(" ".join(collected))
+        index += 1
+    # Lines come from build_lines and are already whitespace-normalized.
+    return " ".join(collected)
 
 
 def parse_fields(lines: List[str]) -> Dict[str, Optional[str]]:
@@ -160,19 +297,25 @@ def parse_fields(lines: List[str]) -> Dict[str, Optional[str]]:
     }
 
     for idx, line in enumerate(lines):
+        found = set(LABEL_SCAN_PATTERN.findall(line))
+        if not found:
+            continue
         for field, labels in LABELS.items():
             if data[field]:
                 continue
-            matched_label = next((label for label in labels if label in line), None)
-            value = split_label_value(line, labels)
+            present = [label for label in labels if label in found]
+            if not present:
+                continue
+            value = split_label_value(line, present)
             if value:
                 data[field] = value
-            elif field == "abstract" and matched_label:
-                data[field] = collect_block(lines, idx, matched_label)
+            elif field == "abstract":
+                data[field] = collect_block(lines, idx, present[0])
 
-    combined_text = " ".join(lines).lower()
-    is_online = any(keyword in combined_text for keyword in ONLINE_KEYWORDS)
-    is_offline = any(keyword in combined_text for keyword in OFFLINE_KEYWORDS)
+    text = " ".join(lines)
+    combined_text = text.lower()
+    is_online = any(keyword in combined_text for keyword in ONLINE_KEYWORDS_LOWER)
+    is_offline = any(keyword in combined_text for keyword in OFFLINE_KEYWORDS_LOWER)
     if is_online and is_offline:
         data["mode"] = "hybrid"
     elif is_online:
@@ -180,30 +323,42 @@ def parse_fields(lines: List[str]) -> Dict[str, Optional[str]]:
     elif is_offline:
         data["mode"] = "offline"
 
-    urls = URL_PATTERN.findall(" ".join(lines))
-    if urls:
-        data["online_link"] = urls[0]
+    url_match = URL_PATTERN.search(text)
+    if url_match:
+        data["online_link"] = url_match.group(0)
 
     if not data["start_time"]:
-        date_match = DATE_PATTERN.search(" ".join(lines))
-        time_match = TIME_PATTERN.search(" ".join(lines))
-        if date_match and time_match:
-            data["start_time"] = f"{date_match.group(0)} {time_match.group(0)}"
-        elif date_match:
-            data["start_time"] = date_match.group(0)
+        date_match = DATE_PATTERN.search(text)
+        if date_match:
+            time_match = TIME_PATTERN.search(text)
+            if time_match:
+                data["start_time"] = f"{date_match.group(0)} {time_match.group(0)}"
+            else:
+                data["start_time"] = date_match.group(0)
 
     return data
 
 
 def extract_title(soup: BeautifulSoup) -> str:
-    for tag in ["h1", "h2", "h3"]:
-        element = soup.find(tag)
+    first: Dict[str, Tag] = {}
+    for element in soup.descendants:
+        name = element.name
+        if name not in TITLE_TAG_NAMES or name in first:
+            continue
+        first[name] = element
+        if name == "h1":
+            text = normalize_text(element.get_text(" ", strip=True))
+            if text:
+                return text
+    for tag in ["h2", "h3"]:
+        element = first.get(tag)
         if element:
             text = normalize_text(element.get_text(" ", strip=True))
             if text:
                 return text
-    if soup.title and soup.title.string:
-        return normalize_text(soup.title.string)
+    title = first.get("title")
+    if title and title.string:
+        return normalize_text(title.string)
     return ""
 
 
@@ -211,15 +366,16 @@ def search_speaker_intro(speaker: str) -> Tuple[Optional[str], Optional[str]]:
     if not speaker or len(speaker) < 2:
         return None, None
     query = f"{speaker} 简介 数学"
+    search_url = "https://duckduckgo.com/html/"
     try:
-        response = requests.get(
-            "https://duckduckgo.com/html/",
-            params={"q": query},
-            headers={"User-Agent": USER_AGENT},
-            timeout=REQUEST_TIMEOUT,
-        )
+        with host_slot(search_url):
+            response = SESSION.get(
+                search_url,
+                params={"q": query},
+                timeout=REQUEST_TIMEOUT,
+            )
         response.raise_for_status()
-        soup = BeautifulSoup(response.text, "html.parser")
+        soup = BeautifulSoup(response.text, "lxml")
         result = soup.find("a", class_="result__a")
         snippet = soup.find(class_="result__snippet")
         url = result["href"] if result and result.has_attr("href") else None
@@ -230,12 +386,30 @@ def search_speaker_intro(speaker: str) -> Tuple[Optional[str], Optional[str]]:
         return None, None
 
 
+def enrich_pending_speakers() -> int:
+    if not ENRICHMENT_LOCK.acquire(blocking=False):
+        return 0
+    try:
+        searched = 0
+        while True:
+            speakers = list_pending_speakers(SPEAKER_BATCH_SIZE)
+            if not speakers:
+                return searched
+            for speaker in speakers:
+                if searched:
+                    time.sleep(SPEAKER_SEARCH_DELAY)
+                speaker_intro, speaker_intro_url = search_speaker_intro(speaker)
+                save_speaker_intro(speaker, speaker_intro, speaker_intro_url)
+                searched += 1
+    finally:
+        ENRICHMENT_LOCK.release()
+
+
 def build_record(source_page_url: str, detail_url: str, html: str) -> Dict[str, Optional[str]]:
-    soup = BeautifulSoup(html, "html.parser")
+    soup = BeautifulSoup(html, "lxml", parse_only=DETAIL_STRAINER)
     title = extract_title(soup)
     lines = build_lines(soup)
     fields = parse_fields(lines)
-    speaker_intro, speaker_intro_url = search_speaker_intro(fields.get("speaker") or "")
 
     record: Dict[str, Optional[str]] = {
         "source_page_url": source_page_url,
@@ -248,41 +422,96 @@ def build_record(source_page_url: str, detail_url: str, html: str) -> Dict[str,
         "abstract": fields.get("abstract"),
         "mode": fields.get("mode"),
         "online_link": fields.get("online_link"),
-        "speaker_intro": speaker_intro,
-        "speaker_intro_url": speaker_intro_url,
+        "speaker_intro": None,
+        "speaker_intro_url": None,
     }
 
-    payload = {field: record.get(field) for field in MEETING_FIELDS}
-    payload_json = json.dumps(payload, ensure_ascii=False, sort_keys=True)
-    record["data_hash"] = hashlib.sha256(payload_json.encode("utf-8")).hexdigest()
+    record["data_hash"] = compute_data_hash(record)
     return record
 
 
+def crawl_detail(
+    source_page_url: str, detail_url: str, cached: Optional[Dict[str, Any]]
+) -> Tuple[FetchedPage, Optional[Dict[str, Optional[str]]]]:
+    page = fetch_html(detail_url, cached)
+    if page.html is None:
+        return page, None
+    return page, build_record(source_page_url, page.url, page.html)
+
+
+def http_cache_entry(detail_url: str, page: FetchedPage) -> Dict[str, Any]:
+    return {
+        "url": detail_url,
+        "final_url": page.url,
+        "etag": page.etag,
+        "last_modified": page.last_modified,
+        "content_hash": page.content_hash,
+        "parser_version": PARSER_VERSION,
+    }
+
+
 def crawl_page(page_id: int, url: str) -> List[CrawlResult]:
-    html, final_url = fetch_html(url)
-    candidates = extract_candidate_links(html, final_url)
+    listing = fetch_html(url)
+    final_url = listing.url
+    candidates = extract_candidate_links(listing.html or "", final_url, MAX_DETAIL_PAGES)
     if len(candidates) >= 2:
-        detail_urls = candidates[:20]
+        detail_urls = candidates
     else:
         detail_urls = [final_url]
 
+    cache_entries = get_http_cache_entries(detail_urls, PARSER_VERSION)
+    records: List[Dict[str, Optional[str]]] = []
+    parsed: List[Tuple[str, FetchedPage]] = []
+    unchanged: List[Tuple[str, FetchedPage]] = []
+    with ThreadPoolExecutor(max_workers=MAX_DETAIL_WORKERS) as executor:
+        futures = {
+            executor.submit(
+                crawl_detail, final_url, detail_url, cache_entries.get(detail_url)
+            ): detail_url
+            for detail_url in detail_urls
+        }
+        for future in as_completed(futures):
+            detail_url = futures[future]
+            try:
+                page, record = future.result()
+            except Exception as exc:  # noqa: BLE001 - keep crawling best-effort
+                LOGGER.warning("Failed to parse %s: %s", detail_url, exc)
+                continue
+            if record is None:
+                unchanged.append((detail_url, page))
+            else:
+                records.append(record)
+                parsed.append((detail_url, page))
+
     results: List[CrawlResult] = []
-    for detail_url in detail_urls:
-        try:
-            detail_html, detail_final = fetch_html(detail_url)
-            record = build_record(final_url, detail_final, detail_html)
-            outcome = upsert_meeting(record)
-            results.append(
-                CrawlResult(
-                    meeting_id=outcome["meeting_id"],
-                    created=outcome["created"],
-                    changed=outcome["changed"],
-                    source_url=detail_final,
-                )
+    try:
+        outcomes = upsert_meetings(records)
+        seen_ids = touch_meetings([page.url for _, page in unchanged])
+        save_http_cache_entries(
+            [http_cache_entry(detail_url, page) for detail_url, page in parsed + unchanged]
+        )
+    except Exception as exc:  # noqa: BLE001 - keep crawling best-effort
+        LOGGER.warning("Failed to store meetings from %s: %s", final_url, exc)
+        outcomes = []
+        seen_ids = {}
+    for record, outcome in zip(records, outcomes):
+        results.append(
+            CrawlResult(
+                meeting_id=outcome["meeting_id"],
+                created=outcome["created"],
+                changed=outcome["changed"],
+                source_url=record["source_url"],
             )
-            time.sleep(1)
-        except Exception as exc:  # noqa: BLE001 - keep crawling best-effort
-            LOGGER.warning("Failed to parse %s: %s", detail_url, exc)
+        )
+    for source_url, meeting_id in seen_ids.items():
+        results.append(
+            CrawlResult(
+                meeting_id=meeting_id,
+                created=False,
+                changed=False,
+                source_url=source_url,
+            )
+        )
 
     update_page_checked(page_id, utc_now_iso())
     return results
@@ -1,13 +1,24 @@
 from __future__ import annotations
 
-import json
+import hashlib
 import os
 import sqlite3
+import threading
 from contextlib import contextmanager
-from datetime import datetime, timezone
-from typing import Any, Dict, Iterable, List, Optional
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 DB_PATH = os.path.join(os.path.dirname(__file__), "data", "auto_academic.db")
+CONNECTION_PRAGMAS = (
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA cache_size = -65536",
+)
+
+_LOCAL = threading.local()
 
 MEETING_FIELDS = (
     "source_page_url",
@@ -23,27 +34,128 @@ MEETING_FIELDS = (
     "speaker_intro",
     "speaker_intro_url",
 )
+ENRICHMENT_FIELDS = ("speaker_intro", "speaker_intro_url")
+HASHED_FIELDS = tuple(
+    sorted(field for field in MEETING_FIELDS if field not in ENRICHMENT_FIELDS)
+)
+# Stored in PRAGMA user_version; bump whenever compute_data_hash changes.
+DATA_HASH_VERSION = 1
+SPEAKER_RETRY_INTERVAL = timedelta(hours=12)
+
+UPSERT_MEETING_SQL = """
+    INSERT INTO meetings (
+        source_page_url, source_url, title, start_time, location, speaker,
+        topic, abstract, mode, online_link, speaker_intro, speaker_intro_url,
+        data_hash, created_at, last_seen_at, last_updated_at
+    )
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(source_url) DO UPDATE SET
+        source_page_url = excluded.source_page_url,
+        title = excluded.title,
+        start_time = excluded.start_time,
+        location = excluded.location,
+        speaker = excluded.speaker,
+        topic = excluded.topic,
+        abstract = excluded.abstract,
+        mode = excluded.mode,
+        online_link = excluded.online_link,
+        speaker_intro = CASE
+            WHEN excluded.speaker_intro IS NOT NULL THEN excluded.speaker_intro
+            WHEN meetings.speaker IS excluded.speaker THEN meetings.speaker_intro
+        END,
+        speaker_intro_url = CASE
+            WHEN excluded.speaker_intro_url IS NOT NULL THEN excluded.speaker_intro_url
+            WHEN meetings.speaker IS excluded.speaker THEN meetings.speaker_intro_url
+        END,
+        data_hash = excluded.data_hash,
+        last_seen_at = excluded.last_seen_at,
+        last_updated_at = CASE
+            WHEN meetings.data_hash != excluded.data_hash
+            THEN excluded.last_updated_at
+            ELSE meetings.last_updated_at
+        END
+"""
+HISTORY_TRIGGER_SQL = """
+    CREATE TRIGGER IF NOT EXISTS meetings_record_history
+    AFTER UPDATE OF data_hash ON meetings
+    WHEN OLD.data_hash != NEW.data_hash
+    BEGIN
+        INSERT INTO meeting_history (meeting_id, recorded_at, data_hash, payload_json)
+        VALUES (
+            OLD.id,
+            NEW.last_updated_at,
+            OLD.data_hash,
+            json_object(
+                'source_page_url', OLD.source_page_url,
+                'source_url', OLD.source_url,
+                'title', OLD.title,
+                'start_time', OLD.start_time,
+                'location', OLD.location,
+                'speaker', OLD.speaker,
+                'topic', OLD.topic,
+                'abstract', OLD.abstract,
+                'mode', OLD.mode,
+                'online_link', OLD.online_link,
+                'speaker_intro', OLD.speaker_intro,
+                'speaker_intro_url', OLD.speaker_intro_url
+            )
+        );
+    END
+"""
+
+QUEUE_SPEAKER_SQL = """
+    INSERT INTO speaker_enrichment_queue (speaker, status)
+    VALUES (?, 'pending')
+    ON CONFLICT(speaker) DO UPDATE SET status = 'pending' WHERE status = 'failed'
+"""
+APPLY_SPEAKER_INTROS_SQL = """
+    UPDATE meetings
+    SET speaker_intro = queue.speaker_intro, speaker_intro_url = queue.speaker_intro_url
+    FROM speaker_enrichment_queue AS queue
+    WHERE meetings.speaker = queue.speaker
+      AND queue.status = 'done'
+      AND meetings.speaker_intro IS NULL
+      AND meetings.speaker_intro_url IS NULL
+"""
 
 
 def utc_now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 
-@contextmanager
-def get_connection() -> Iterable[sqlite3.Connection]:
+def open_connection() -> sqlite3.Connection:
     os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(DB_PATH, isolation_level=None)
     conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA foreign_keys = ON")
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def thread_connection() -> sqlite3.Connection:
+    conn = getattr(_LOCAL, "conn", None)
+    if conn is None:
+        conn = open_connection()
+        _LOCAL.conn = conn
+    return conn
+
+
+@contextmanager
+def get_connection(write: bool = False) -> Iterable[sqlite3.Connection]:
+    conn = thread_connection()
+    conn.execute("BEGIN IMMEDIATE" if write else "BEGIN")
     try:
         yield conn
-        conn.commit()
-    finally:
-        conn.close()
+        if conn.in_transaction:
+            conn.execute("COMMIT")
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
 
 
 def init_db() -> None:
-    with get_connection() as conn:
+    with get_connection(write=True) as conn:
         conn.executescript(
             """
             CREATE TABLE IF NOT EXISTS monitored_pages (
@@ -79,8 +191,57 @@ def init_db() -> None:
                 payload_json TEXT NOT NULL,
                 FOREIGN KEY(meeting_id) REFERENCES meetings(id) ON DELETE CASCADE
             );
+            CREATE TABLE IF NOT EXISTS speaker_enrichment_queue (
+                speaker TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                last_tried TEXT,
+                speaker_intro TEXT,
+                speaker_intro_url TEXT
+            );
+            CREATE TABLE IF NOT EXISTS http_cache (
+                url TEXT PRIMARY KEY,
+                final_url TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash TEXT,
+                parser_version INTEGER,
+                fetched_at TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_meetings_last_seen
+                ON meetings(last_seen_at DESC);
+            CREATE INDEX IF NOT EXISTS idx_history_meeting
+                ON meeting_history(meeting_id, recorded_at DESC);
             """
         )
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(http_cache)")}
+        if "parser_version" not in columns:
+            conn.execute("ALTER TABLE http_cache ADD COLUMN parser_version INTEGER")
+    with get_connection(write=True) as conn:
+        if conn.execute("PRAGMA user_version").fetchone()[0] < DATA_HASH_VERSION:
+            migrate_data_hashes(conn)
+        conn.execute(HISTORY_TRIGGER_SQL)
+
+
+def migrate_data_hashes(conn: sqlite3.Connection) -> None:
+    # Rehash stored meetings without recording history, so a new hash format
+    # is not mistaken for a content change on the next crawl.
+    conn.execute("DROP TRIGGER IF EXISTS meetings_record_history")
+    rows = conn.execute(f"SELECT id, {', '.join(HASHED_FIELDS)} FROM meetings").fetchall()
+    conn.executemany(
+        "UPDATE meetings SET data_hash = ? WHERE id = ?",
+        [(compute_data_hash(dict(row)), row["id"]) for row in rows],
+    )
+    conn.execute(f"PRAGMA user_version = {DATA_HASH_VERSION}")
+
+
+def compute_data_hash(record: Dict[str, Optional[str]]) -> str:
+    digest = hashlib.blake2b(digest_size=32)
+    for field in HASHED_FIELDS:
+        digest.update(field.encode("utf-8"))
+        digest.update(b"\x1f")
+        digest.update((record.get(field) or "").encode("utf-8"))
+        digest.update(b"\x1e")
+    return digest.hexdigest()
 
 
 def row_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
@@ -115,7 +276,7 @@ def get_page_by_url(url: str) -> Optional[Dict[str, Any]]:
 
 def create_monitored_page(url: str) -> Dict[str, Any]:
     created_at = utc_now_iso()
-    with get_connection() as conn:
+    with get_connection(write=True) as conn:
         conn.execute(
             "INSERT INTO monitored_pages (url, created_at) VALUES (?, ?)",
             (url, created_at),
@@ -128,7 +289,7 @@ def create_monitored_page(url: str) -> Dict[str, Any]:
 
 
 def update_page_checked(page_id: int, timestamp: str) -> None:
-    with get_connection() as conn:
+    with get_connection(write=True) as conn:
         conn.execute(
             "UPDATE monitored_pages SET last_checked_at = ? WHERE id = ?",
             (timestamp, page_id),
@@ -180,109 +341,188 @@ def get_meeting_history(meeting_id: int) -> List[Dict[str, Any]]:
     return [row_to_dict(row) for row in rows]
 
 
-def upsert_meeting(record: Dict[str, Any]) -> Dict[str, Any]:
+def check_meeting_record(record: Dict[str, Any]) -> None:
     required_keys = {"source_page_url", "source_url", "data_hash"}
     missing = required_keys - record.keys()
     if missing:
         raise ValueError(f"Missing required fields: {missing}")
 
+
+def meeting_params(record: Dict[str, Any], now: str) -> Tuple[Any, ...]:
+    return (
+        record.get("source_page_url"),
+        record.get("source_url"),
+        record.get("title"),
+        record.get("start_time"),
+        record.get("location"),
+        record.get("speaker"),
+        record.get("topic"),
+        record.get("abstract"),
+        record.get("mode"),
+        record.get("online_link"),
+        record.get("speaker_intro"),
+        record.get("speaker_intro_url"),
+        record.get("data_hash"),
+        now,
+        now,
+        now,
+    )
+
+
+def upsert_meeting(record: Dict[str, Any]) -> Dict[str, Any]:
+    return upsert_meetings([record])[0]
+
+
+def upsert_meetings(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    for record in records:
+        check_meeting_record(record)
+    if not records:
+        return []
+
     now = utc_now_iso()
+    source_urls = [record["source_url"] for record in records]
+    placeholders = ", ".join("?" for _ in source_urls)
+    with get_connection(write=True) as conn:
+        previous_hashes = {
+            row["source_url"]: row["data_hash"]
+            for row in conn.execute(
+                f"SELECT source_url, data_hash FROM meetings WHERE source_url IN ({placeholders})",
+                source_urls,
+            )
+        }
+        conn.executemany(
+            UPSERT_MEETING_SQL, [meeting_params(record, now) for record in records]
+        )
+        meeting_ids = {
+            row["source_url"]: row["id"]
+            for row in conn.execute(
+                f"SELECT id, source_url FROM meetings WHERE source_url IN ({placeholders})",
+                source_urls,
+            )
+        }
+
+        outcomes: List[Dict[str, Any]] = []
+        speakers: List[str] = []
+        for record in records:
+            source_url = record["source_url"]
+            created = source_url not in previous_hashes
+            changed = created or previous_hashes[source_url] != record.get("data_hash")
+            outcomes.append(
+                {"meeting_id": meeting_ids[source_url], "created": created, "changed": changed}
+            )
+            if changed and record.get("speaker"):
+                speakers.append(record["speaker"])
+        queue_speakers(conn, speakers)
+    return outcomes
+
+
+def touch_meetings(source_urls: List[str]) -> Dict[str, int]:
+    if not source_urls:
+        return {}
+    placeholders = ", ".join("?" for _ in source_urls)
+    with get_connection(write=True) as conn:
+        rows = conn.execute(
+            f"""
+            UPDATE meetings SET last_seen_at = ?
+            WHERE source_url IN ({placeholders})
+            RETURNING id, source_url
+            """,
+            (utc_now_iso(), *source_urls),
+        ).fetchall()
+    return {row["source_url"]: row["id"] for row in rows}
+
+
+def get_http_cache_entries(
+    urls: List[str], parser_version: int
+) -> Dict[str, Dict[str, Any]]:
+    if not urls:
+        return {}
+    placeholders = ", ".join("?" for _ in urls)
     with get_connection() as conn:
-        existing = conn.execute(
-            """
-            SELECT id, source_page_url, source_url, title, start_time, location, speaker,
-                   topic, abstract, mode, online_link, speaker_intro, speaker_intro_url,
-                   data_hash, created_at, last_seen_at, last_updated_at
-            FROM meetings
-            WHERE source_url = ?
+        rows = conn.execute(
+            f"""
+            SELECT http_cache.url, http_cache.final_url, http_cache.etag,
+                   http_cache.last_modified, http_cache.content_hash
+            FROM http_cache
+            JOIN meetings ON meetings.source_url = http_cache.final_url
+            WHERE http_cache.url IN ({placeholders})
+              AND http_cache.parser_version = ?
             """,
-            (record["source_url"],),
-        ).fetchone()
+            (*urls, parser_version),
+        ).fetchall()
+    return {row["url"]: row_to_dict(row) for row in rows}
 
-        if not existing:
-            payload = {field: record.get(field) for field in MEETING_FIELDS}
-            conn.execute(
-                """
-                INSERT INTO meetings (
-                    source_page_url, source_url, title, start_time, location, speaker,
-                    topic, abstract, mode, online_link, speaker_intro, speaker_intro_url,
-                    data_hash, created_at, last_seen_at, last_updated_at
-                )
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    record.get("source_page_url"),
-                    record.get("source_url"),
-                    record.get("title"),
-                    record.get("start_time"),
-                    record.get("location"),
-                    record.get("speaker"),
-                    record.get("topic"),
-                    record.get("abstract"),
-                    record.get("mode"),
-                    record.get("online_link"),
-                    record.get("speaker_intro"),
-                    record.get("speaker_intro_url"),
-                    record.get("data_hash"),
-                    now,
-                    now,
-                    now,
-                ),
-            )
-            meeting_id = conn.execute(
-                "SELECT id FROM meetings WHERE source_url = ?",
-                (record["source_url"],),
-            ).fetchone()["id"]
-            return {"meeting_id": meeting_id, "created": True, "changed": True}
-
-        existing_dict = row_to_dict(existing)
-        if existing_dict.get("data_hash") != record.get("data_hash"):
-            history_payload = {
-                field: existing_dict.get(field) for field in MEETING_FIELDS
-            }
-            conn.execute(
-                """
-                INSERT INTO meeting_history (meeting_id, recorded_at, data_hash, payload_json)
-                VALUES (?, ?, ?, ?)
-                """,
-                (
-                    existing_dict["id"],
-                    now,
-                    existing_dict.get("data_hash"),
-                    json.dumps(history_payload, ensure_ascii=True),
-                ),
+
+def save_http_cache_entries(entries: List[Dict[str, Any]]) -> None:
+    if not entries:
+        return
+    now = utc_now_iso()
+    with get_connection(write=True) as conn:
+        conn.executemany(
+            """
+            INSERT INTO http_cache (
+                url, final_url, etag, last_modified, content_hash, parser_version, fetched_at
             )
-            conn.execute(
-                """
-                UPDATE meetings
-                SET source_page_url = ?, title = ?, start_time = ?, location = ?,
-                    speaker = ?, topic = ?, abstract = ?, mode = ?, online_link = ?,
-                    speaker_intro = ?, speaker_intro_url = ?, data_hash = ?,
-                    last_seen_at = ?, last_updated_at = ?
-                WHERE id = ?
-                """,
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(url) DO UPDATE SET
+                final_url = excluded.final_url,
+                etag = excluded.etag,
+                last_modified = excluded.last_modified,
+                content_hash = excluded.content_hash,
+                parser_version = excluded.parser_version,
+                fetched_at = excluded.fetched_at
+            """,
+            [
                 (
-                    record.get("source_page_url"),
-                    record.get("title"),
-                    record.get("start_time"),
-                    record.get("location"),
-                    record.get("speaker"),
-                    record.get("topic"),
-                    record.get("abstract"),
-                    record.get("mode"),
-                    record.get("online_link"),
-                    record.get("speaker_intro"),
-                    record.get("speaker_intro_url"),
-                    record.get("data_hash"),
+                    entry["url"],
+                    entry["final_url"],
+                    entry.get("etag"),
+                    entry.get("last_modified"),
+                    entry.get("content_hash"),
+                    entry.get("parser_version"),
                     now,
-                    now,
-                    existing_dict["id"],
-                ),
-            )
-            return {"meeting_id": existing_dict["id"], "created": False, "changed": True}
+                )
+                for entry in entries
+            ],
+        )
+
 
+def queue_speakers(conn: sqlite3.Connection, speakers: Iterable[str]) -> None:
+    conn.executemany(QUEUE_SPEAKER_SQL, [(speaker,) for speaker in set(speakers)])
+    conn.execute(APPLY_SPEAKER_INTROS_SQL)
+
+
+def list_pending_speakers(limit: int = 20) -> List[str]:
+    retry_before = (datetime.now(timezone.utc) - SPEAKER_RETRY_INTERVAL).isoformat()
+    with get_connection() as conn:
+        rows = conn.execute(
+            """
+            SELECT speaker FROM speaker_enrichment_queue
+            WHERE status = 'pending'
+               OR (status = 'failed' AND (last_tried IS NULL OR last_tried < ?))
+            ORDER BY speaker
+            LIMIT ?
+            """,
+            (retry_before, limit),
+        ).fetchall()
+    return [row["speaker"] for row in rows]
+
+
+def save_speaker_intro(
+    speaker: str, speaker_intro: Optional[str], speaker_intro_url: Optional[str]
+) -> None:
+    status = "done" if speaker_intro or speaker_intro_url else "failed"
+    with get_connection(write=True) as conn:
         conn.execute(
-            "UPDATE meetings SET last_seen_at = ? WHERE id = ?",
-            (now, existing_dict["id"]),
+            """
+            UPDATE speaker_enrichment_queue
+            SET status = ?, last_tried = ?, speaker_intro = ?, speaker_intro_url = ?
+            WHERE speaker = ?
+            """,
+            (status, utc_now_iso(), speaker_intro, speaker_intro_url, speaker),
         )
-    return {"meeting_id": existing_dict["id"], "created": False, "changed": False}
+        if status == "done":
+            conn.execute(
+                "UPDATE meetings SET speaker_intro = ?, speaker_intro_url = ? WHERE speaker = ?",
+                (speaker_intro, speaker_intro_url, speaker),
+            )
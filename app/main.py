@@ -3,17 +3,18 @@ from __future__ import annotations
 import asyncio
 import logging
 import sqlite3
-from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Any, Dict, List
 from zoneinfo import ZoneInfo
 
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.cron import CronTrigger
 from fastapi import BackgroundTasks, FastAPI, HTTPException
 from fastapi.responses import FileResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import AnyHttpUrl, BaseModel
 
-from .crawler import crawl_page
+from .crawler import crawl_page, enrich_pending_speakers
 from .db import (
     create_monitored_page,
     get_meeting,
@@ -32,8 +33,17 @@ APP_ROOT = Path(__file__).resolve().parent
 STATIC_DIR = APP_ROOT / "static"
 DEFAULT_TIMEZONE = "Asia/Shanghai"
 
+
+def get_timezone(tz_name: str) -> ZoneInfo:
+    try:
+        return ZoneInfo(tz_name)
+    except Exception:
+        return ZoneInfo("UTC")
+
+
 app = FastAPI(title="Auto Academic Info")
 app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
+scheduler = AsyncIOScheduler(timezone=get_timezone(DEFAULT_TIMEZONE))
 
 
 class PageCreate(BaseModel):
@@ -58,31 +68,29 @@ def run_crawl_all_pages() -> Dict[str, int]:
     return summary
 
 
-def seconds_until_midnight(tz_name: str) -> float:
-    try:
-        tz = ZoneInfo(tz_name)
-    except Exception:
-        tz = ZoneInfo("UTC")
-    now = datetime.now(tz)
-    next_run = (now + timedelta(days=1)).replace(
-        hour=0, minute=0, second=5, microsecond=0
-    )
-    return max((next_run - now).total_seconds(), 0)
-
-
-async def daily_scheduler() -> None:
-    while True:
-        delay = seconds_until_midnight(DEFAULT_TIMEZONE)
-        LOGGER.info("Next scheduled crawl in %s seconds", int(delay))
-        await asyncio.sleep(delay)
-        LOGGER.info("Starting scheduled crawl")
-        await asyncio.to_thread(run_crawl_all_pages)
+async def scheduled_crawl() -> None:
+    LOGGER.info("Starting scheduled crawl")
+    await asyncio.to_thread(run_crawl_all_pages)
+    await asyncio.to_thread(enrich_pending_speakers)
 
 
 @app.on_event("startup")
 async def on_startup() -> None:
     init_db()
-    asyncio.create_task(daily_scheduler())
+    scheduler.add_job(
+        scheduled_crawl,
+        CronTrigger(hour=0, minute=0, second=5, timezone=scheduler.timezone),
+        id="daily_crawl",
+        replace_existing=True,
+        misfire_grace_time=3600,
+        coalesce=True,
+    )
+    scheduler.start()
+
+
+@app.on_event("shutdown")
+async def on_shutdown() -> None:
+    scheduler.shutdown(wait=False)
 
 
 @app.get("/")
@@ -123,12 +131,14 @@ def fetch_page(page_id: int, background_tasks: BackgroundTasks) -> Dict[str, str
     if not page:
         raise HTTPException(status_code=404, detail="Page not found")
     background_tasks.add_task(crawl_page, page["id"], page["url"])
+    background_tasks.add_task(enrich_pending_speakers)
     return {"status": "queued"}
 
 
 @app.post("/api/crawl")
 def fetch_all(background_tasks: BackgroundTasks) -> Dict[str, str]:
     background_tasks.add_task(run_crawl_all_pages)
+    background_tasks.add_task(enrich_pending_speakers)
     return {"status": "queued"}
 
 